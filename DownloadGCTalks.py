@@ -1,4 +1,5 @@
 import calendar
+import hashlib
 import os
 import requests
 import jq
@@ -10,6 +11,9 @@ import pandas as pd
 import asyncio
 from playwright.async_api import async_playwright
 import pickle
+import re
+import sqlite3
+import threading
 from urllib.parse import urlparse
 
 import logging.handlers
@@ -111,10 +115,10 @@ def get_toc_list(years, months):
     print(f"Found {len(tocs)} TOCs from {len(months)} conferences")
     return tocs
 
-def lookup_talk_pdf_url(talk_content_url: str):
-    """ Get PDF URL talk based on URL from TOC
+def get_talk_content(talk_content_url: str):
+    """ Get the full talk content JSON based on URL from TOC
     :param talk_content_url:
-    :return pdf_url
+    :return content JSON object, or False on error
     """
     try:
         r = requests.get(talk_content_url, timeout=1)
@@ -125,7 +129,18 @@ def lookup_talk_pdf_url(talk_content_url: str):
         logger.warning(f"Error getting talk content with {talk_content_url=}: {err}")
         return False
     # print(f"{r2.text=}")
-    j = r.json()
+    return r.json()
+
+def lookup_talk_pdf_url(talk_content_url: str, j=None):
+    """ Get PDF URL talk based on URL from TOC
+    :param talk_content_url:
+    :param j: talk content JSON if already downloaded
+    :return pdf_url
+    """
+    if j is None:
+        j = get_talk_content(talk_content_url)
+    if not j:
+        return False
     pdf_url = jq.first('.content.meta.pdf.source', j)
     if not pdf_url:
         logger.warning(f"No PDF URL found for {talk_content_url=}")
@@ -134,9 +149,258 @@ def lookup_talk_pdf_url(talk_content_url: str):
     return pdf_url
 
 def lookup_talk_pdf_runner(talk):
-    talk['talk_pdf_url'] = lookup_talk_pdf_url(talk['talk_content_url'])
+    j = get_talk_content(talk['talk_content_url'])
+    talk['talk_pdf_url'] = lookup_talk_pdf_url(talk['talk_content_url'], j)
+    # Mine the scripture references in the same pass so the content JSON is only downloaded once
+    # Leave talk_scripture_refs unset if the download failed so the index keeps what it already has for this talk
+    if j:
+        talk['talk_scripture_refs'] = extract_scripture_refs(j)
     return talk
 
+###############
+# Scripture reference index
+#
+# Each talk's content JSON has a dict of footnotes under .content.footnotes, e.g.
+#   {"note1a": {"marker": "1a", "text": "<p><a class=\"scripture-ref\" href=\"/study/scriptures/bofm/moro/10.4-5?lang=eng\">Moro. 10:4–5</a></p>",
+#               "referenceUris": [{"type": "scripture-ref", "href": "/study/scriptures/bofm/moro/10.4-5?lang=eng"}]}}
+# and the talk body may also link scriptures directly with <a class="scripture-ref" href="/study/scriptures/...">.
+#
+# The references are stored in SQLite, one row per verse range, so that lookups by verse, by talk, or by speaker
+# are index lookups instead of a re-crawl:
+#   talks(talk_canonical_uri, talk_date, talk_speaker, talk_title)
+#   scripture_refs(talk_canonical_uri, footnote, volume, book, chapter, verse_start, verse_end, href)
+# verse_start/verse_end are NULL for a reference to a whole chapter.
+#
+
+scripture_href_re = re.compile(r'/scriptures/(?P<volume>[\w-]+)/(?P<book>[\w-]+)/(?P<chapter>\d+)(?:\.(?P<verses>[\d,\-–]+))?')
+scripture_id_re = re.compile(r'[?&](?:amp;)?id=(?P<ids>[^&#"]+)')
+html_href_re = re.compile(r'href="([^"]*/scriptures/[^"]*)"')
+
+def parse_scripture_href(href: str):
+    """ Split a scripture href into one (volume, book, chapter, verse_start, verse_end) tuple per verse range.
+    Verses are given either in the path or as paragraph ids in the query:
+    >>> parse_scripture_href('/study/scriptures/bofm/moro/10.4-5,7?lang=eng')
+    [('bofm', 'moro', 10, 4, 5), ('bofm', 'moro', 10, 7, 7)]
+    >>> parse_scripture_href('/study/scriptures/bofm/moro/10?lang=eng&id=p4-p5,p7#p4')
+    [('bofm', 'moro', 10, 4, 5), ('bofm', 'moro', 10, 7, 7)]
+    >>> parse_scripture_href('/study/scriptures/nt/john/3?lang=eng')
+    [('nt', 'john', 3, None, None)]
+
+    :param href:
+    :return list of tuples, empty if href is not a scripture reference
+    """
+    m = scripture_href_re.search(href)
+    if not m:
+        return []
+    volume, book, chapter = m['volume'], m['book'], int(m['chapter'])
+    verses = m['verses']
+    if not verses:
+        id_match = scripture_id_re.search(href)
+        if id_match:
+            verses = re.sub(r'p(\d+)', r'\1', id_match['ids'])
+    ranges = []
+    for verse_range in (verses or '').replace('–', '-').split(','):
+        start, _, end = verse_range.partition('-')
+        if not (start.isdigit() and (not end or end.isdigit())):
+            continue  # Not a verse, e.g. id=title1
+        ranges.append((volume, book, chapter, int(start), int(end or start)))
+    if not ranges:
+        return [(volume, book, chapter, None, None)]
+    return ranges
+
+def extract_scripture_refs(j):
+    """ Collect scripture references from footnotes and body links of a talk content JSON
+    :param j: talk content JSON
+    :return list of dicts with footnote, href and parsed verse range, one per distinct footnote and verse range
+    """
+    refs = []
+    seen = set()
+    seen_ranges = set()
+
+    def add(footnote, href):
+        for (volume, book, chapter, verse_start, verse_end) in parse_scripture_href(href):
+            verse_range = (volume, book, chapter, verse_start, verse_end)
+            if footnote is None and verse_range in seen_ranges:
+                continue  # Body links usually repeat a footnote
+            if (footnote, verse_range) in seen:
+                continue
+            seen.add((footnote, verse_range))
+            seen_ranges.add(verse_range)
+            refs.append({'footnote': footnote, 'volume': volume, 'book': book, 'chapter': chapter,
+                         'verse_start': verse_start, 'verse_end': verse_end, 'href': href})
+
+    content = j.get('content') or {}
+    footnotes = content.get('footnotes') or {}
+    if isinstance(footnotes, list):
+        footnotes = {note.get('id'): note for note in footnotes}
+    for note_id, note in footnotes.items():
+        footnote = note.get('marker') or note_id
+        hrefs = [uri.get('href') for uri in note.get('referenceUris') or [] if uri.get('href')]
+        if not hrefs:
+            hrefs = html_href_re.findall(note.get('text') or '')
+        for href in hrefs:
+            add(footnote, href)
+    for href in html_href_re.findall(content.get('body') or ''):
+        add(None, href)
+    return refs
+
+def open_scripture_index(db_filename):
+    conn = sqlite3.connect(db_filename)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS talks (
+            talk_canonical_uri TEXT PRIMARY KEY,
+            talk_date TEXT,
+            talk_speaker TEXT,
+            talk_title TEXT);
+        CREATE TABLE IF NOT EXISTS scripture_refs (
+            talk_canonical_uri TEXT NOT NULL REFERENCES talks(talk_canonical_uri),
+            footnote TEXT,
+            volume TEXT NOT NULL,
+            book TEXT NOT NULL,
+            chapter INTEGER NOT NULL,
+            verse_start INTEGER,
+            verse_end INTEGER,
+            href TEXT);
+        CREATE INDEX IF NOT EXISTS scripture_refs_verse ON scripture_refs (book, chapter, verse_start, verse_end);
+        CREATE INDEX IF NOT EXISTS scripture_refs_talk ON scripture_refs (talk_canonical_uri);
+        CREATE INDEX IF NOT EXISTS talks_speaker ON talks (talk_speaker);
+        CREATE INDEX IF NOT EXISTS talks_date ON talks (talk_date);
+        ''')
+    return conn
+
+def update_scripture_index(talks, db_filename):
+    """ Incrementally add talks and their scripture references to the index.
+    Talks already in the index are replaced, everything else in the index is kept.
+    Talks whose content could not be downloaded (no 'talk_scripture_refs') are left untouched.
+    :param talks:
+    :param db_filename:
+    :return number of talks indexed
+    """
+    indexed = 0
+    with open_scripture_index(db_filename) as conn:
+        for talk in talks:
+            if 'talk_scripture_refs' not in talk:
+                continue
+            uri = talk['talk_canonical_uri']
+            conn.execute('INSERT OR REPLACE INTO talks VALUES (?, ?, ?, ?)',
+                         (uri, talk['talk_date'], talk['talk_speaker'], talk['talk_title']))
+            conn.execute('DELETE FROM scripture_refs WHERE talk_canonical_uri = ?', (uri,))
+            conn.executemany('INSERT INTO scripture_refs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             [(uri, ref['footnote'], ref['volume'], ref['book'], ref['chapter'],
+                               ref['verse_start'], ref['verse_end'], ref['href'])
+                              for ref in talk['talk_scripture_refs']])
+            indexed += 1
+    conn.close()
+    logger.info(f"Indexed scripture references for {indexed} talks in {db_filename}")
+    return indexed
+
+# Book names as written in talks -> book in Gospel Library scripture URLs
+scripture_books = {
+    'genesis': 'gen', 'exodus': 'ex', 'leviticus': 'lev', 'numbers': 'num', 'deuteronomy': 'deut', 'joshua': 'josh',
+    'judges': 'judg', 'ruth': 'ruth', '1-samuel': '1-sam', '2-samuel': '2-sam', '1-kings': '1-kgs', '2-kings': '2-kgs',
+    '1-chronicles': '1-chr', '2-chronicles': '2-chr', 'ezra': 'ezra', 'nehemiah': 'neh', 'esther': 'esth', 'job': 'job',
+    'psalms': 'ps', 'psalm': 'ps', 'proverbs': 'prov', 'ecclesiastes': 'eccl', 'song-of-solomon': 'song',
+    'isaiah': 'isa', 'jeremiah': 'jer', 'lamentations': 'lam', 'ezekiel': 'ezek', 'daniel': 'dan', 'hosea': 'hosea',
+    'joel': 'joel', 'amos': 'amos', 'obadiah': 'obad', 'jonah': 'jonah', 'micah': 'micah', 'nahum': 'nahum',
+    'habakkuk': 'hab', 'zephaniah': 'zeph', 'haggai': 'hag', 'zechariah': 'zech', 'malachi': 'mal',
+    'matthew': 'matt', 'mark': 'mark', 'luke': 'luke', 'john': 'john', 'acts': 'acts', 'romans': 'rom',
+    '1-corinthians': '1-cor', '2-corinthians': '2-cor', 'galatians': 'gal', 'ephesians': 'eph', 'philippians': 'philip',
+    'colossians': 'col', '1-thessalonians': '1-thes', '2-thessalonians': '2-thes', '1-timothy': '1-tim',
+    '2-timothy': '2-tim', 'titus': 'titus', 'philemon': 'philem', 'hebrews': 'heb', 'james': 'james',
+    '1-peter': '1-pet', '2-peter': '2-pet', '1-john': '1-jn', '2-john': '2-jn', '3-john': '3-jn', 'jude': 'jude',
+    'revelation': 'rev',
+    '1-nephi': '1-ne', '2-nephi': '2-ne', 'jacob': 'jacob', 'enos': 'enos', 'jarom': 'jarom', 'omni': 'omni',
+    'words-of-mormon': 'w-of-m', 'mosiah': 'mosiah', 'alma': 'alma', 'helaman': 'hel', '3-nephi': '3-ne',
+    '4-nephi': '4-ne', 'mormon': 'morm', 'ether': 'ether', 'moroni': 'moro',
+    'doctrine-and-covenants': 'dc', 'd&c': 'dc', 'moses': 'moses', 'abraham': 'abr',
+    'joseph-smith—matthew': 'js-m', 'joseph-smith-matthew': 'js-m', 'joseph-smith—history': 'js-h',
+    'joseph-smith-history': 'js-h', 'articles-of-faith': 'a-of-f',
+}
+scripture_citation_re = re.compile(r'^(?P<book>.*?\D)\s*(?P<chapter>\d+)(?::(?P<verses>[\d,\-– ]+))?$')
+
+def scripture_reference_to_href(reference: str):
+    """ Turn a scripture reference into a scripture href that parse_scripture_href understands
+    >>> scripture_reference_to_href('Moroni 10:4-5')
+    '/scriptures/any/moro/10.4-5'
+    >>> scripture_reference_to_href('bofm/moro/10.4-5')
+    '/scriptures/bofm/moro/10.4-5'
+    >>> scripture_reference_to_href('moro/10.4-5')
+    '/scriptures/any/moro/10.4-5'
+
+    :param reference: "Book chapter:verses", book/chapter[.verses] optionally prefixed with the scripture volume,
+        or a scripture href
+    :return href
+    """
+    reference = reference.strip()
+    if '/scriptures/' in reference:
+        return reference
+    m = scripture_citation_re.match(reference)
+    if m and '/' not in reference:
+        book = re.sub(r'\s+', '-', m['book'].strip().rstrip('.').lower())
+        book = scripture_books.get(book, book)
+        reference = f"{book}/{m['chapter']}"
+        if m['verses']:
+            reference += '.' + m['verses'].replace(' ', '')
+    parts = reference.strip('/').split('/')
+    if len(parts) == 2:
+        parts.insert(0, 'any')
+    return '/scriptures/' + '/'.join(parts)
+
+def query_talks_citing(db_filename, reference, since=None):
+    """ Find every talk citing a scripture reference, e.g. "Moroni 10:4-5", "moro/10.4-5" or
+    "/study/scriptures/bofm/moro/10.4-5". A talk matches if it cites any verse in the range, or the whole chapter.
+    :param db_filename:
+    :param reference: see scripture_reference_to_href
+    :param since: earliest talk year to include
+    :return list of (talk_date, talk_speaker, talk_title, talk_canonical_uri), one per talk
+    """
+    ranges = parse_scripture_href(scripture_reference_to_href(reference))
+    if not ranges:
+        raise ValueError(f"Can't parse scripture reference {reference!r}, "
+                         f"use e.g. \"Moroni 10:4-5\" or \"moro/10.4-5\"")
+    conn = open_scripture_index(db_filename)
+    results = []
+    for (_, book, chapter, verse_start, verse_end) in ranges:
+        sql = '''
+            SELECT DISTINCT t.talk_date, t.talk_speaker, t.talk_title, t.talk_canonical_uri
+            FROM scripture_refs r JOIN talks t USING (talk_canonical_uri)
+            WHERE r.book = ? AND r.chapter = ?'''
+        params = [book, chapter]
+        if verse_start is not None:
+            sql += ' AND (r.verse_start IS NULL OR (r.verse_start <= ? AND r.verse_end >= ?))'
+            params += [verse_end, verse_start]
+        if since:
+            sql += ' AND t.talk_date >= ?'
+            params.append(f"{since}")
+        results.extend(conn.execute(sql + ' ORDER BY t.talk_date', params).fetchall())
+    conn.close()
+    return sorted(set(results))
+
+def query_talk_refs(db_filename, talk_canonical_uri):
+    """ List the scripture references cited by one talk
+    :return list of (footnote, volume, book, chapter, verse_start, verse_end)
+    """
+    conn = open_scripture_index(db_filename)
+    rows = conn.execute('''
+        SELECT footnote, volume, book, chapter, verse_start, verse_end FROM scripture_refs
+        WHERE talk_canonical_uri = ? ORDER BY rowid''', (talk_canonical_uri,)).fetchall()
+    conn.close()
+    return rows
+
+def query_speaker_refs(db_filename, speaker):
+    """ Count the talks in which a speaker cited each scripture reference
+    :return list of (volume, book, chapter, verse_start, verse_end, talks) most cited first
+    """
+    conn = open_scripture_index(db_filename)
+    rows = conn.execute('''
+        SELECT r.volume, r.book, r.chapter, r.verse_start, r.verse_end, COUNT(DISTINCT talk_canonical_uri) AS n
+        FROM scripture_refs r JOIN talks t USING (talk_canonical_uri)
+        WHERE t.talk_speaker = ?
+        GROUP BY r.volume, r.book, r.chapter, r.verse_start, r.verse_end
+        ORDER BY n DESC, r.volume, r.book, r.chapter, r.verse_start''', (speaker,)).fetchall()
+    conn.close()
+    return rows
+
 def get_first_sunday(year, month):
     # Find the first day of the month
     first_day = datetime(year, month, 1)
@@ -279,16 +543,55 @@ def download_talk_pdf(url, path):
             f.write(response.content)
     return file_pathname
 
-async def url_to_pdf(url, output_path):
+# Each print worker thread keeps its own event loop and Chromium browser, reused for every talk it prints
+print_browser = threading.local()
+print_browsers = {}
+print_browsers_lock = threading.Lock()
+
+def get_print_browser():
+    """ Get the Chromium browser of the current print worker, launching it on first use or after a crash
+    :return event loop, browser
+    """
+    if getattr(print_browser, 'playwright', None) is None:
+        loop = asyncio.new_event_loop()
+        try:
+            playwright = loop.run_until_complete(async_playwright().start())
+        except Exception:
+            loop.close()
+            raise
+        print_browser.loop, print_browser.playwright, print_browser.browser = loop, playwright, None
+        with print_browsers_lock:
+            print_browsers[threading.get_ident()] = (loop, playwright, None)
+    if print_browser.browser is None or not print_browser.browser.is_connected():
+        print_browser.browser = print_browser.loop.run_until_complete(print_browser.playwright.chromium.launch())
+        with print_browsers_lock:
+            print_browsers[threading.get_ident()] = (print_browser.loop, print_browser.playwright, print_browser.browser)
+    return print_browser.loop, print_browser.browser
+
+def close_print_browsers():
+    """ Close the browsers of all print workers, once the print lane is finished """
+    with print_browsers_lock:
+        for (loop, playwright, browser) in print_browsers.values():
+            try:
+                if browser is not None:
+                    loop.run_until_complete(browser.close())
+                loop.run_until_complete(playwright.stop())
+            except Exception as err:
+                logger.warning(f"Error closing print browser: {err}")
+            finally:
+                loop.close()
+        print_browsers.clear()
+
+async def url_to_pdf(browser, url, output_path):
     # https://apitemplate.io/blog/how-to-convert-html-to-pdf-using-python/
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page()
+    page = await browser.new_page()
+    try:
         await page.goto(url)
         await page.pdf(path=output_path, display_header_footer=True,
                        margin={"top": "40px", "bottom": "40px"}
                        )
-        await browser.close()
+    finally:
+        await page.close()
 def print_talk_to_pdf(url, file_pathname):
     if not url:
         return False
@@ -299,43 +602,266 @@ def print_talk_to_pdf(url, file_pathname):
     else:
         logger.debug(f"Print to PDF of  {file_pathname}")
         # HTML(url).write_pdf(file_pathname) # Doesn't print footnotes
-        asyncio.run(url_to_pdf(url, file_pathname))
+        loop, browser = get_print_browser()
+        loop.run_until_complete(url_to_pdf(browser, url, file_pathname))
         if os.path.isfile(file_pathname) and os.path.getsize(file_pathname) > 0:
             return file_pathname
         else:
             logger.debug(f"Error printing to pdf {file_pathname}")
             return False
-def download_talks_runner(talk):
-
+def download_talk_runner(talk):
+    """ Download lane: fetch the talk's direct PDF, if there is one
+    :param talk:
+    :return talk
+    """
     pdf_url = talk['talk_pdf_url']
     if pdf_url and args.download_talk_pdfs:
         talk['talk_pdf_filename'] = download_talk_pdf(pdf_url, args.download_dir + '/talk_pdfs')
     else:
         talk['talk_pdf_filename'] = False
-    # Only try print to PDF if PDF download fails
-    if talk['talk_pdf_filename'] == False and args.download_talk_prints:
-        pfile = talk['talk_date'] + '-' + os.path.basename(talk['talk_canonical_uri']) + '.pdf'
-        try:
-            talk['talk_print_filename'] = print_talk_to_pdf(talk['talk_study_url'],
-                                                        args.download_dir + '/talk_prints/' + pfile)
-        except Exception as err:
-            # raise SystemExit(err)
-            logger.warning(f"Error printing talk PDF {talk['talk_study_url']}: {err}")
-            return False
+    talk['talk_print_filename'] = False
+    talk['talk_filename'] = talk['talk_pdf_filename']
+    return talk
 
-    else:
+def print_talk_runner(talk):
+    """ Print lane: render the talk's study page to PDF with Chromium
+    :param talk:
+    :return talk
+    """
+    pfile = talk['talk_date'] + '-' + os.path.basename(talk['talk_canonical_uri']) + '.pdf'
+    try:
+        talk['talk_print_filename'] = print_talk_to_pdf(talk['talk_study_url'],
+                                                    args.download_dir + '/talk_prints/' + pfile)
+    except Exception as err:
+        # raise SystemExit(err)
+        logger.warning(f"Error printing talk PDF {talk['talk_study_url']}: {err}")
         talk['talk_print_filename'] = False
     talk['talk_filename'] = talk['talk_pdf_filename'] or talk['talk_print_filename']
     return talk
 
+# Rough peak memory of one headless Chromium render of a talk page
+print_worker_memory = 512 * 1024 * 1024
+
+# Never run more Chromium browsers than the 10 workers of the original single pool
+max_print_workers = 10
+
+def get_available_memory():
+    """ Memory available for new processes, including reclaimable page cache where the OS reports it
+    :return bytes, or None if unknown
+    """
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        pass
+    try:
+        # No available memory on macOS, so use half of the physical memory instead
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def get_print_workers():
+    """ Size the print lane to the number of cores, capped so the Chromium renders fit in available memory
+    :return number of print workers
+    """
+    workers = min(os.cpu_count() or 1, max_print_workers)
+    memory = get_available_memory()
+    if memory:
+        workers = min(workers, memory // print_worker_memory)
+    return max(1, workers)
+
+def report_lane_progress(progress, lane):
+    done, total = progress[lane]
+    if done % 50 == 0:
+        # The print lane total still grows while downloads fail, so this is only a progress update
+        print(f"{lane:>8s}: {done:>5d}/{total:<5d} " +
+              ' '.join(f"{other}: {d}/{t}" for other, (d, t) in progress.items() if other != lane))
+    logger.debug(f"{lane} lane progress {done}/{total}")
+
 def download_talks(talks, path):
+    """ Download the talk PDFs, falling back to printing the talk's study page.
+    Cheap network-bound PDF downloads and expensive CPU/memory-bound Chromium prints run in separate lanes,
+    so a few slow prints can't hold up the downloads. Talks with a PDF URL are downloaded first, and talks
+    without one (or whose download fails) are printed in the background while the downloads continue.
+    :param talks:
+    :param path:
+    :return talks, in the same order
+    """
     os.makedirs(path, exist_ok=True)
     os.makedirs(path + '/talk_prints/', exist_ok=True)
     os.makedirs(path + '/talk_pdfs/', exist_ok=True)
 
-    with cf.ThreadPoolExecutor(max_workers=10) as executor:
-        new_list = list(executor.map(download_talks_runner, talks))
-    return new_list
+    print_workers = args.print_workers or get_print_workers()
+    logger.info(f"Downloading with {args.download_workers} download workers and {print_workers} print workers")
+    progress = {'download': [0, 0], 'print': [0, 0]}
+    lanes = {}
+    with cf.ThreadPoolExecutor(max_workers=args.download_workers, thread_name_prefix='download') as download_executor, \
+            cf.ThreadPoolExecutor(max_workers=print_workers, thread_name_prefix='print') as print_executor:
+
+        def submit_print(talk):
+            talk['talk_filename'] = talk['talk_print_filename'] = False
+            if args.download_talk_prints and talk['talk_study_url']:
+                progress['print'][1] += 1
+                lanes[print_executor.submit(print_talk_runner, talk)] = 'print'
+
+        for talk in talks:
+            if talk['talk_pdf_url'] and args.download_talk_pdfs:
+                progress['download'][1] += 1
+                lanes[download_executor.submit(download_talk_runner, talk)] = 'download'
+        for talk in talks:
+            if not (talk['talk_pdf_url'] and args.download_talk_pdfs):
+                talk['talk_pdf_filename'] = False
+                submit_print(talk)
+
+        pending = set(lanes)
+        while pending:
+            done, pending = cf.wait(pending, return_when=cf.FIRST_COMPLETED)
+            for future in done:
+                lane = lanes.pop(future)
+                talk = future.result()
+                progress[lane][0] += 1
+                if lane == 'download' and talk['talk_pdf_filename'] is False:
+                    # Only try print to PDF if PDF download fails
+                    submit_print(talk)
+                report_lane_progress(progress, lane)
+            pending = set(lanes)
+    close_print_browsers()
+    for lane, (done, total) in progress.items():
+        print(f"{lane:>8s}: {done:>5d}/{total:<5d} finished")
+    return talks
+
+def hash_file(file_pathname, cached=None):
+    """ SHA-256 of a downloaded talk file, reusing the cached hash if size and mtime are unchanged
+    :param file_pathname:
+    :param cached: previous {'size', 'mtime', 'sha256'} entry for this file, if any
+    :return {'size', 'mtime', 'sha256'}, or None if there is no file
+    """
+    if not file_pathname or not os.path.isfile(file_pathname):
+        return None
+    stat = os.stat(file_pathname)
+    if cached and cached.get('size') == stat.st_size and cached.get('mtime') == stat.st_mtime:
+        return cached
+    sha = hashlib.sha256()
+    with open(file_pathname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha.hexdigest()}
+
+def export_delta(df, state_filename, output_file, batch_size=500):
+    """ Write only the talks that are new or changed since the last acknowledged import, for DEVONthink to import.
+    Each talk is tracked by talk_canonical_uri with a hash of its metadata and of its downloaded file.
+    Talks without a downloaded file are left out until a later run downloads them.
+    The delta rows are written in batches of batch_size to delta_<output_file>_NNN.csv with the same columns as
+    all_<output_file>.csv plus talk_export_status, and listed in delta_<output_file>.json. talk_export_status is
+        new             not exported before
+        file changed    the talk file changed, so the record must be imported again
+        changed         only the metadata changed, so the record can be updated in place
+    The state of the exported talks is saved to <state_filename>.pending and only moves to state_filename once
+    acknowledge_import is called, so every run repeats the talks that haven't been imported yet. Their status is
+    relative to the last export, so a talk that may already be imported is never exported as new twice.
+    :param df: DataFrame of talks in all_<output_file>.csv column order
+    :param state_filename: JSON file with the state of previously imported talks
+    :param output_file:
+    :param batch_size:
+    :return list of delta CSV filenames
+    """
+    if os.path.isfile(state_filename):
+        with open(state_filename, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    else:
+        state = {}
+    if os.path.isfile(state_filename + '.pending'):
+        with open(state_filename + '.pending', 'r', encoding='utf-8') as f:
+            previous_pending_state = json.load(f)
+    else:
+        previous_pending_state = {}
+
+    pending_state = {}
+    delta_rows = []
+    for row in df.to_dict('records'):
+        uri = row['talk_canonical_uri']
+        imported = state.get(uri, {})
+        previous = previous_pending_state.get(uri) or imported
+        file_hash = hash_file(row['talk_filename'], previous.get('file'))
+        if file_hash is None:
+            logger.debug(f"Not exporting {uri}, no talk file")
+            continue
+        metadata_hash = hashlib.sha256(json.dumps(row, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        if imported.get('metadata') == metadata_hash and (imported.get('file') or {}).get('sha256') == file_hash['sha256']:
+            continue
+        if not previous:
+            status = 'new'
+        elif (previous.get('file') or {}).get('sha256') != file_hash['sha256']:
+            status = 'file changed'
+        elif previous.get('metadata') != metadata_hash:
+            status = 'changed'
+        else:
+            status = previous.get('status', 'changed')  # Exported before but not acknowledged yet
+        pending_state[uri] = {'metadata': metadata_hash, 'file': file_hash, 'status': status}
+        delta_rows.append({**row, 'talk_export_status': status})
+
+    manifest_filename = f'delta_{output_file}.json'
+    if os.path.isfile(manifest_filename):
+        # Remove the previous batches so DEVONthink can't pick up a stale one.
+        # Their talks are in this delta too unless the import was acknowledged.
+        with open(manifest_filename, 'r', encoding='utf-8') as f:
+            for batch_filename in json.load(f).get('batches', []):
+                if os.path.isfile(batch_filename):
+                    os.remove(batch_filename)
+
+    delta_df = pd.DataFrame(delta_rows, columns=list(df.columns) + ['talk_export_status'])
+    batches = []
+    for batch_num, start in enumerate(range(0, len(delta_df), batch_size), start=1):
+        batch_filename = f'delta_{output_file}_{batch_num:03d}.csv'
+        delta_df.iloc[start:start + batch_size].to_csv(batch_filename, index=False)
+        batches.append(batch_filename)
+
+    manifest = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'total_talks': len(df),
+        'new_talks': int((delta_df['talk_export_status'] == 'new').sum()),
+        'changed_talks': int((delta_df['talk_export_status'] != 'new').sum()),
+        'batch_size': batch_size,
+        'batches': batches,
+    }
+    with open(manifest_filename, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    with open(state_filename + '.pending', 'w', encoding='utf-8') as f:
+        json.dump(pending_state, f, ensure_ascii=False, indent=4)
+    logger.info(f"Exported {len(delta_df)} new or changed talks of {len(df)} in {len(batches)} batches")
+    print(f"Delta: {manifest['new_talks']} new, {manifest['changed_talks']} changed talks in {len(batches)} batches")
+    return batches
+
+def acknowledge_import(state_filename):
+    """ Record the talks of the last delta export as imported, after all its batches were imported into DEVONthink
+    :param state_filename:
+    :return number of talks acknowledged
+    """
+    pending_filename = state_filename + '.pending'
+    if not os.path.isfile(pending_filename):
+        print(f"Nothing to acknowledge, no {pending_filename}")
+        return 0
+    if os.path.isfile(state_filename):
+        with open(state_filename, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    else:
+        state = {}
+    with open(pending_filename, 'r', encoding='utf-8') as f:
+        pending_state = json.load(f)
+    for uri, entry in pending_state.items():
+        state[uri] = {'metadata': entry['metadata'], 'file': entry['file']}
+    with open(state_filename, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=4)
+    os.remove(pending_filename)
+    logger.info(f"Acknowledged import of {len(pending_state)} talks")
+    print(f"Acknowledged import of {len(pending_state)} talks")
+    return len(pending_state)
 
 if __name__ == "__main__":
     import time
@@ -345,11 +871,41 @@ if __name__ == "__main__":
     parser.add_argument('--download-talk-pdfs', '-D', action='store_true')
     parser.add_argument('--download-talk-prints', '-P', action='store_true')
     parser.add_argument('--download-dir', type=str, default='/tmp/gc_download')
+    parser.add_argument('--download-workers', type=int, default=10)
+    parser.add_argument('--print-workers', type=int, default=0, help='Default: based on cores and memory')
     parser.add_argument('--output-file', '-O', default='talks')
     parser.add_argument('--pickle-file', default='talks.pickle')
     parser.add_argument('--analyze', '-A', action='store_true')
+    parser.add_argument('--scripture-index', default='talks_scriptures.sqlite')
+    parser.add_argument('--export-state', default='talks_export_state.json')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--ack-import', action='store_true', help='Only record the last delta export as imported')
+    parser.add_argument('--cite', help='Only query the scripture index for talks citing e.g. "moro/10.4-5"')
+    parser.add_argument('--since', type=int, help='Earliest year for --cite')
+    parser.add_argument('--talk-refs', help='Only query the scripture index for references cited by a talk canonical URI')
+    parser.add_argument('--speaker-refs', help='Only query the scripture index for references cited by a speaker')
     args = parser.parse_args()
 
+    if args.ack_import:
+        acknowledge_import(args.export_state)
+        raise SystemExit(0)
+
+    if args.cite or args.talk_refs or args.speaker_refs:
+        if args.cite:
+            try:
+                cited_by = query_talks_citing(args.scripture_index, args.cite, args.since)
+            except ValueError as err:
+                parser.error(f"--cite: {err}")
+            for row in cited_by:
+                print(*row, sep='\t')
+        if args.talk_refs:
+            for row in query_talk_refs(args.scripture_index, args.talk_refs):
+                print(*row, sep='\t')
+        if args.speaker_refs:
+            for row in query_speaker_refs(args.scripture_index, args.speaker_refs):
+                print(*row, sep='\t')
+        raise SystemExit(0)
+
     years = []
     months = []
     #for year in (1971, 1973, 1977, 1987, 1991, 2007, 2008, 2010, 2023):
@@ -367,6 +923,10 @@ if __name__ == "__main__":
     talks = generate_talk_list(tocs)
     print(f"Time: generate_talk_list = {time.time() - t1:.2f} seconds")
 
+    t1 = time.time()
+    update_scripture_index(talks, args.scripture_index)
+    print(f"Time: update_scripture_index = {time.time() - t1:.2f} seconds")
+
     t1 = time.time()
     talks = download_talks(talks, args.download_dir)
     print(f"Time: download_talks = {time.time() - t1:.2f} seconds")
@@ -383,6 +943,7 @@ if __name__ == "__main__":
              "talk_pdf_url","reference","talk_content_url","talk_pdf_filename","talk_print_filename"]]
     df_no_pdf = df.query('talk_filename == False')
     df.to_csv('all_' + args.output_file + '.csv', index=False)
+    export_delta(df, args.export_state, args.output_file, args.batch_size)
 
     writer = pd.ExcelWriter('all_' + args.output_file + '.xlsx', engine="xlsxwriter")
     df.to_excel(writer, sheet_name="Conference Talks", index=False)